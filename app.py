@@ -1,7 +1,14 @@
 import streamlit as st
 import pandas as pd
-import pickle
-import requests
+import numpy as np
+import onnxruntime as ort
+import os
+import json
+import time
+import queue
+import threading
+import asyncio
+from collections import defaultdict
 from datetime import datetime
 
 # ===================================================================
@@ -14,76 +21,214 @@ st.set_page_config(page_title="WNBA Live AI Predictor", page_icon="🏀")
 # --- Data Loading and Caching ---
 @st.cache_data
 def load_historical_data(filepath):
-    """Loads the main historical game stats dataset."""
-    try:
-        data = pd.read_csv(filepath)
-        data['athlete_id_1'] = data['athlete_id_1'].astype(int)
-        return data
-    except FileNotFoundError:
+    """
+    Loads each player's most recent game from the historical game stats dataset,
+    indexed by athlete ID. The Parquet copy of the dataset is read when present,
+    falling back to the CSV only when it is missing. The precomputed
+    `wnba_latest.parquet` sidecar next to it is used instead when it is at least
+    as new as that source, so cold starts skip the full parse and sort.
+    """
+    parquet_path = filepath.replace('.csv', '.parquet')
+    source_path = parquet_path if os.path.exists(parquet_path) else filepath
+    if not os.path.exists(source_path):
         return None
 
+    latest_path = os.path.join(os.path.dirname(filepath), 'wnba_latest.parquet')
+    if os.path.exists(latest_path) and os.path.getmtime(latest_path) >= os.path.getmtime(source_path):
+        return pd.read_parquet(latest_path)
+
+    if source_path == parquet_path:
+        # The Parquet copy is stored with compact dtypes, so only the CSV fallback needs them applied
+        data = pd.read_parquet(parquet_path)
+    else:
+        # Stats and averages are parsed straight into float32; IDs may be written as floats in the CSV
+        csv_dtypes = defaultdict(lambda: np.float32, game_id='int64', athlete_id_1='float64', season='int16', game_date=str)
+        data = pd.read_csv(filepath, dtype=csv_dtypes)
+        data['athlete_id_1'] = data['athlete_id_1'].astype(np.int32)
+    # Must match latest_stats_by_player in update_data.py, which writes the sidecar; that module
+    # isn't imported here because it imports requests and creates a requests.Session at import time
+    return data.loc[data.groupby('athlete_id_1')['game_date'].idxmax()].set_index('athlete_id_1')
+
+def load_session(filepath):
+    """
+    Creates an ONNX Runtime inference session for an exported model, tuned for the
+    few-row predictions the app makes: they gain nothing from a thread pool, so
+    inference runs on the calling thread instead of waking (and spinning) workers.
+    """
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = 1
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.add_session_config_entry('session.intra_op.allow_spinning', '0')
+    with open(filepath, 'rb') as f:
+        return ort.InferenceSession(f.read(), options, providers=["CPUExecutionProvider"])
+
 @st.cache_resource
 def load_models():
-    """Loads the pre-trained prediction models."""
+    """
+    Loads the pre-trained prediction model. Points, rebounds and assists are fused
+    into one graph, so a single run returns all three projections.
+    """
     try:
-        with open('model_points.pkl', 'rb') as f: model_pts = pickle.load(f)
-        with open('model_rebounds.pkl', 'rb') as f: model_reb = pickle.load(f)
-        with open('model_assists.pkl', 'rb') as f: model_ast = pickle.load(f)
-        return model_pts, model_reb, model_ast
+        return load_session('model_stats.onnx')
     except FileNotFoundError:
-        return None, None, None
+        return None
 
-@st.cache_data(ttl=86400) # Cache the roster for a full day (24 * 60 * 60 seconds)
-def get_all_players_from_espn():
+class PredictionBatcher:
     """
-    Fetches every team's roster to build a complete, live map of player IDs to names.
-    This is the most reliable way to get a full, current list of all players.
+    Coalesces predictions from concurrent sessions into a single model run.
+    Streamlit serves every session from a thread in the same process, so each caller
+    queues its feature row and waits while a background thread flushes the queue once
+    it holds max_batch_size rows or batch_wait_timeout_s has passed since the first.
     """
-    st.write("Fetching live WNBA roster data for the season...")
-    player_map = {}
-    try:
+    def __init__(self, model, max_batch_size=32, batch_wait_timeout_s=0.02):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.batch_wait_timeout_s = batch_wait_timeout_s
+        self.requests = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def predict(self, features):
+        """Returns the model output for a (1, n_features) row, blocking until its batch has run."""
+        request = {'features': features, 'done': threading.Event()}
+        self.requests.put(request)
+        request['done'].wait()
+        if 'error' in request:
+            raise request['error']
+        return request['result']
+
+    def _run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.batch_wait_timeout_s
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.requests.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+
+            try:
+                outputs = self.model.run(None, {'x': np.vstack([request['features'] for request in batch])})[0]
+                for request, output in zip(batch, outputs):
+                    request['result'] = output
+            except Exception as e:
+                for request in batch:
+                    request['error'] = e
+            for request in batch:
+                request['done'].set()
+
+@st.cache_resource
+def get_prediction_batcher(_model):
+    """Starts one batcher per process, shared by every session."""
+    return PredictionBatcher(_model)
+
+async def fetch_team_roster(client, team_id):
+    """Fetches a single team's roster from ESPN."""
+    roster_url = f"https://site.api.espn.com/apis/site/v2/sports/basketball/wnba/teams/{team_id}?enable=roster"
+    roster_response = await client.get(roster_url)
+    roster_response.raise_for_status()
+    return roster_response.json().get('team', {}).get('athletes', [])
+
+async def fetch_all_rosters():
+    """
+    Fetches the list of teams, then every team's roster concurrently over a single
+    HTTP/2 connection, so the total wait is the slowest request rather than the sum.
+    """
+    # Only needed when the on-disk roster cache is stale, so keep it off the cold-start path
+    import httpx
+
+    transport = httpx.AsyncHTTPTransport(http2=True, retries=3)
+    async with httpx.AsyncClient(transport=transport, timeout=10) as client:
         teams_url = "https://site.api.espn.com/apis/site/v2/sports/basketball/wnba/teams"
-        teams_response = requests.get(teams_url, timeout=10)
+        teams_response = await client.get(teams_url)
         teams_response.raise_for_status()
         teams_data = teams_response.json().get('sports', [{}])[0].get('leagues', [{}])[0].get('teams', [])
 
-        for team_entry in teams_data:
-            team_id = team_entry['team']['id']
-            roster_url = f"https://site.api.espn.com/apis/site/v2/sports/basketball/wnba/teams/{team_id}?enable=roster"
-            roster_response = requests.get(roster_url, timeout=10)
-            roster_response.raise_for_status()
-            roster_data = roster_response.json().get('team', {}).get('athletes', [])
-            
-            for player in roster_data:
-                player_map[int(player['id'])] = player['fullName']
-        
-        st.success("Live roster data successfully loaded!")
-        return player_map
-    except Exception as e:
-        st.error(f"Could not fetch live WNBA rosters. Error: {e}", icon="📡")
+        return await asyncio.gather(
+            *(fetch_team_roster(client, team_entry['team']['id']) for team_entry in teams_data)
+        )
+
+def read_roster_cache(filepath, max_age):
+    """Returns the player map saved on disk, or None if it is missing or older than max_age seconds."""
+    try:
+        if time.time() - os.path.getmtime(filepath) >= max_age:
+            return None
+        with open(filepath) as f:
+            return {int(pid): name for pid, name in json.load(f).items()}
+    except (OSError, ValueError):
         return None
 
+def write_roster_cache(filepath, player_map):
+    """Saves the player map to disk, swapping the file in atomically so readers never see a partial write."""
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(player_map, f)
+        os.replace(tmp_path, filepath)
+    except OSError:
+        pass # The on-disk cache is an optimization; the in-memory cache still applies
+
+@st.cache_data(ttl=86400) # Cache the roster for a full day (24 * 60 * 60 seconds)
+def get_all_players_from_espn():
+    """
+    Fetches every team's roster to build a complete, live map of player IDs to names,
+    along with its inverse so a selected name resolves to its player ID directly and
+    the sorted list of names for the dropdown.
+    This is the most reliable way to get a full, current list of all players.
+    A copy is kept in `roster_cache.json` so restarts within a day skip the ESPN calls.
+    """
+    player_map = read_roster_cache('roster_cache.json', max_age=86400)
+    if player_map is None:
+        st.write("Fetching live WNBA roster data for the season...")
+        player_map = {}
+        try:
+            for roster_data in asyncio.run(fetch_all_rosters()):
+                for player in roster_data:
+                    player_map[int(player['id'])] = player['fullName']
+            
+            write_roster_cache('roster_cache.json', player_map)
+            st.success("Live roster data successfully loaded!")
+        except Exception as e:
+            st.error(f"Could not fetch live WNBA rosters. Error: {e}", icon="📡")
+            return None, None, None
+
+    name_to_id = {name: pid for pid, name in player_map.items()}
+    return player_map, name_to_id, sorted(player_map.values())
+
 # --- Main Application Logic ---
 st.title('🤖 WNBA AI Prop Predictor')
 st.info("Select a player to project their stats, using a live-updating player list.")
 
 # Load all assets
-hist_df = load_historical_data('wnba_data_for_app.csv')
-model_pts, model_reb, model_ast = load_models()
-player_map = get_all_players_from_espn()
+latest_by_id = load_historical_data('wnba_data_for_app.csv')
+model = load_models()
+player_map, name_to_id, all_player_names = get_all_players_from_espn()
 
-if not all([hist_df is not None, player_map is not None, model_pts is not None]):
+if not all([latest_by_id is not None, player_map is not None, model is not None]):
     st.error(
         "A critical asset could not be loaded. This could be a missing file in the repository "
-        "(`wnba_data_for_app.csv` or model `.pkl` files) or an issue fetching live roster data from ESPN."
+        "(`wnba_data_for_app.parquet`, or its `wnba_data_for_app.csv` export, or `model_stats.onnx`) "
+        "or an issue fetching live roster data from ESPN."
     )
 else:
     # --- UI Elements ---
     st.sidebar.header("Select a Player")
     
-    # The dropdown menu is now populated with EVERY player in the league
-    all_player_names = sorted(player_map.values())
+    batcher = get_prediction_batcher(model)
+
+    # A single float32 row is all the models need for one prediction
+    feature_order = json.loads(model.get_modelmeta().custom_metadata_map['feature_names'])
+    feature_buffer = np.empty((1, len(feature_order)), dtype=np.float32)
+
+    # Projections already made in this session are reused until the dataset changes
+    data_version = latest_by_id['game_date'].max()
+    if st.session_state.get('data_version') != data_version:
+        st.session_state['data_version'] = data_version
+        st.session_state['predictions'] = {}
+    predictions = st.session_state['predictions']
     
+    # The dropdown menu is now populated with EVERY player in the league,
+    # using the names sorted once when the roster was loaded
     selected_player_name = st.sidebar.selectbox(
         'Choose a player:',
         all_player_names,
@@ -93,21 +238,20 @@ else:
     if st.sidebar.button(f'Predict Stats for {selected_player_name}', type="primary"):
         try:
             # Find the player's ID from our live player map
-            player_id = [pid for pid, name in player_map.items() if name == selected_player_name][0]
+            player_id = name_to_id[selected_player_name]
 
-            # Find the most recent stats for this player from our historical dataset
-            player_latest_stats = hist_df[hist_df['athlete_id_1'] == player_id].sort_values(by='game_date').iloc[-1]
-            
-            # Ensure the feature order is correct before predicting
-            feature_order = model_pts.get_booster().feature_names
-            features_for_prediction = pd.DataFrame([player_latest_stats[feature_order]])
+            if player_id not in predictions:
+                # Look up the most recent stats for this player from our historical dataset
+                player_latest_stats = latest_by_id.loc[player_id]
 
-            st.header(f"Projection for: {selected_player_name}")
+                # Copy the features into the row buffer in the order the models expect
+                feature_buffer[0] = player_latest_stats[feature_order].to_numpy(dtype=np.float32)
 
-            # Make the predictions
-            predicted_pts = model_pts.predict(features_for_prediction)[0]
-            predicted_reb = model_reb.predict(features_for_prediction)[0]
-            predicted_ast = model_ast.predict(features_for_prediction)[0]
+                # Make all three predictions in one run, batched with any other sessions predicting now
+                predictions[player_id] = tuple(batcher.predict(feature_buffer))
+            predicted_pts, predicted_reb, predicted_ast = predictions[player_id]
+
+            st.header(f"Projection for: {selected_player_name}")
 
             # Display the results
             col1, col2, col3 = st.columns(3)
@@ -115,7 +259,7 @@ else:
             col2.metric("Projected Rebounds", f"{predicted_reb:.1f}")
             col3.metric("Projected Assists", f"{predicted_ast:.1f}")
 
-        except IndexError:
+        except KeyError:
             st.error(f"'{selected_player_name}' is a current roster player, but no historical game data was found for them in our dataset. This is common for rookies or players who recently joined the league.")
         except Exception as e:
             st.error(f"An unexpected error occurred during prediction: {e}")
@@ -0,0 +1,64 @@
+# export_onnx.py
+# Regenerates the .onnx model served by app.py from the .ubj boosters.
+# Export-time only, not needed by the app: pip install xgboost onnx onnxmltools
+import json
+import xgboost as xgb
+from onnx import TensorProto, helper
+from onnxmltools import convert_xgboost
+from onnxmltools.convert.common.data_types import FloatTensorType
+
+def convert_booster(filepath):
+    """Converts a saved XGBoost booster into an ONNX model taking a float32 feature matrix 'x'."""
+    booster = xgb.Booster()
+    booster.load_model(filepath)
+    feature_names = booster.feature_names
+
+    # onnxmltools only understands XGBoost's default f0, f1, ... feature names
+    booster.feature_names = None
+    onnx_model = convert_xgboost(
+        booster, initial_types=[('x', FloatTensorType([None, len(feature_names)]))]
+    )
+
+    # Keep the feature order with the model so the app can fill its input buffer correctly
+    entry = onnx_model.metadata_props.add()
+    entry.key, entry.value = 'feature_names', json.dumps(feature_names)
+    return onnx_model
+
+def combine_models(onnx_models):
+    """
+    Fuses per-stat ONNX models into one graph that feeds the shared input 'x' to every
+    tree ensemble and concatenates their predictions into a single 'stats' output,
+    one column per model in the order given.
+    """
+    first = next(iter(onnx_models.values()))
+    input_name = first.graph.input[0].name
+    nodes, outputs = [], []
+    for stat, onnx_model in onnx_models.items():
+        # Prefix every internal edge so the subgraphs don't collide, but keep the shared input
+        rename = lambda edge: edge if edge == input_name else f"{stat}_{edge}"
+        for node in onnx_model.graph.node:
+            node.name = f"{stat}_{node.name}"
+            node.input[:] = [rename(edge) for edge in node.input]
+            node.output[:] = [rename(edge) for edge in node.output]
+            nodes.append(node)
+        outputs.append(rename(onnx_model.graph.output[0].name))
+
+    nodes.append(helper.make_node('Concat', outputs, ['stats'], axis=1))
+    graph = helper.make_graph(
+        nodes, 'wnba_stats', [first.graph.input[0]],
+        [helper.make_tensor_value_info('stats', TensorProto.FLOAT, [None, len(outputs)])]
+    )
+    # The converted models only import the ai.onnx.ml domain; Concat needs the default one
+    opset_imports = [opset for opset in first.opset_import if opset.domain != ''] + [helper.make_opsetid('', 13)]
+    combined = helper.make_model(graph, opset_imports=opset_imports, ir_version=first.ir_version)
+    combined.metadata_props.extend(first.metadata_props)
+    entry = combined.metadata_props.add()
+    entry.key, entry.value = 'stats', json.dumps(list(onnx_models))
+    return combined
+
+if __name__ == "__main__":
+    stats = ['points', 'rebounds', 'assists']
+    onnx_models = {stat: convert_booster(f"model_{stat}.ubj") for stat in stats}
+    with open("model_stats.onnx", "wb") as f:
+        f.write(combine_models(onnx_models).SerializeToString())
+    print("Exported the points, rebounds and assists boosters to 'model_stats.onnx'.")
@@ -0,0 +1,45 @@
+# test_update_data.py
+import numpy as np
+import pandas as pd
+from update_data import update_features
+
+def rolling_reference(df):
+    """The plain pandas definition of the features: per-player rolling means of earlier games."""
+    df = df.sort_values(by=['athlete_id_1', 'game_date']).reset_index(drop=True)
+    for window in [3, 5, 10]:
+        for stat in ['points', 'rebounds', 'assists']:
+            df[f'avg_{stat}_last_{window}'] = df.groupby('athlete_id_1')[stat].transform(
+                lambda x: x.shift(1).rolling(window, min_periods=1).mean()
+            )
+    return df
+
+def make_game_logs(n_players=6, n_games=15, seed=0):
+    rng = np.random.default_rng(seed)
+    n = n_players * n_games
+    return pd.DataFrame({
+        'athlete_id_1': np.repeat(np.arange(n_players), n_games),
+        'game_date': np.tile(pd.date_range('2024-05-01', periods=n_games).strftime('%Y-%m-%d'), n_players),
+        'points': rng.integers(0, 30, n).astype(float),
+        'rebounds': rng.integers(0, 12, n).astype(float),
+        'assists': rng.integers(0, 10, n).astype(float),
+    }).sample(frac=1, random_state=seed) # update_features must not rely on the input order
+
+def test_update_features_matches_rolling_means():
+    df = make_game_logs()
+    pd.testing.assert_frame_equal(update_features(df), rolling_reference(df))
+
+def test_update_features_skips_missing_stats_within_each_player():
+    df = make_game_logs()
+    df.loc[df.sample(frac=0.2, random_state=1).index, ['points', 'assists']] = np.nan
+    pd.testing.assert_frame_equal(update_features(df), rolling_reference(df))
+
+def test_missing_stat_does_not_leak_into_other_players():
+    df = pd.DataFrame({
+        'athlete_id_1': [1, 1, 1, 2, 2, 2],
+        'game_date': ['2024-05-01', '2024-05-02', '2024-05-03'] * 2,
+        'points': [1.0, np.nan, 3.0, 4.0, 5.0, 6.0],
+        'rebounds': 0.0,
+        'assists': 0.0,
+    })
+    features = update_features(df)
+    np.testing.assert_array_equal(features['avg_points_last_3'], [np.nan, 1.0, 1.0, np.nan, 4.0, 4.5])
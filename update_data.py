@@ -1,13 +1,25 @@
 # update_data.py
 import pandas as pd
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 
+# One pooled session keeps connections to ESPN alive between calls and retries transient
+# failures: dropped connections as well as rate limiting and 5xx responses
+session = requests.Session()
+session.mount("https://", HTTPAdapter(
+    pool_connections=16, pool_maxsize=16, max_retries=Retry(
+        total=3, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=["GET"]
+    )
+))
+
 def get_game_data_for_date(date_str):
     """Fetches all game data for a specific date from ESPN's API."""
     try:
         url = f"https://site.api.espn.com/apis/site/v2/sports/basketball/wnba/scoreboard?dates={date_str}"
-        response = requests.get(url, timeout=15)
+        response = session.get(url, timeout=15)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -15,47 +27,122 @@ def get_game_data_for_date(date_str):
         return None
 
 def parse_espn_data(raw_data):
-    """Parses raw JSON from ESPN into a clean list of player game logs."""
-    game_logs = []
+    """Parses raw JSON from ESPN into a clean DataFrame of player game logs."""
+    columns = ['game_id', 'athlete_id_1', 'season', 'game_date', 'points', 'rebounds', 'assists']
     games = raw_data.get('events', [])
-    for game in games:
-        competition = game.get('competitions', [{}])[0]
-        game_date = competition.get('date')
-        
-        for competitor in competition.get('competitors', []):
-            team_id = competitor.get('id')
-            # The player stats are nested deep inside
-            for athlete in competitor.get('roster', []):
-                stats = athlete.get('statistics', [{}])[0].get('stats', [])
-                if len(stats) >= 3: # Need at least Pts, Reb, Ast
-                    game_logs.append({
-                        'game_id': game.get('id'),
-                        'athlete_id_1': int(athlete.get('id')),
-                        'season': raw_data.get('season', {}).get('year'),
-                        'game_date': game_date,
-                        'points': float(stats[0]), # Assuming order: Pts, Reb, Ast
-                        'rebounds': float(stats[1]),
-                        'assists': float(stats[2])
-                    })
+    if not games:
+        return pd.DataFrame(columns=columns)
+
+    # As before, only each game's first competition is read and missing levels count as empty
+    games = [
+        {**game, 'competitions': [{**competition, 'competitors': competition.get('competitors', [])}]}
+        for game in games
+        for competition in game.get('competitions', [{}])[:1]
+    ]
+
+    # The player stats are nested deep inside each competitor's roster
+    competitors = pd.json_normalize(
+        games, record_path=['competitions', 'competitors'],
+        meta=['id', ['competitions', 'date']], meta_prefix='game.', errors='ignore'
+    )
+    if 'roster' not in competitors:
+        return pd.DataFrame(columns=columns)
+    athletes = competitors[['game.id', 'game.competitions.date', 'roster']].explode('roster').dropna(subset=['roster'])
+    roster = pd.json_normalize(athletes['roster'].tolist())
+    if 'statistics' not in roster:
+        return pd.DataFrame(columns=columns)
+
+    stats = roster['statistics'].str[0].str.get('stats')
+    has_stats = (stats.str.len() >= 3).to_numpy() # Need at least Pts, Reb, Ast
+    if not has_stats.any():
+        return pd.DataFrame(columns=columns)
+    athletes, roster, stats = athletes[has_stats], roster[has_stats], stats[has_stats]
+
+    game_logs = pd.DataFrame({
+        'game_id': athletes['game.id'].to_numpy(),
+        'athlete_id_1': roster['id'].astype(int).to_numpy(),
+        'season': raw_data.get('season', {}).get('year'),
+        'game_date': athletes['game.competitions.date'].to_numpy(),
+    }, columns=columns)
+    # Assuming order: Pts, Reb, Ast
+    game_logs[['points', 'rebounds', 'assists']] = pd.DataFrame(stats.tolist()).iloc[:, :3].astype(float).to_numpy()
     return game_logs
 
 def update_features(df):
     """Calculates rolling average features on the entire dataset."""
-    df = df.sort_values(by=['athlete_id_1', 'game_date'])
+    stats = ['points', 'rebounds', 'assists']
+    df = df.sort_values(by=['athlete_id_1', 'game_date']).reset_index(drop=True)
+    values = df[stats].to_numpy(dtype=np.float64)
+    athlete_ids = df['athlete_id_1'].to_numpy()
+
+    # How many earlier games each row has, counting from the start of its player's block
+    rows = np.arange(len(df))
+    is_first_game = np.r_[True, athlete_ids[1:] != athlete_ids[:-1]]
+    games_before = rows - np.maximum.accumulate(np.where(is_first_game, rows, 0))
+
+    # Running totals give every window's sum over the previous games with a single subtraction,
+    # so all three stats for all three windows come from one pass over the data. Missing stats
+    # add nothing to the sums or the counts, so like rolling() they are skipped, not propagated.
+    is_present = ~np.isnan(values)
+    zero_row = np.zeros((1, len(stats)))
+    totals = np.vstack([zero_row, np.cumsum(np.nan_to_num(values), axis=0)])
+    present_totals = np.vstack([zero_row, np.cumsum(is_present, axis=0)])
     for window in [3, 5, 10]:
-        for stat in ['points', 'rebounds', 'assists']:
-            df[f'avg_{stat}_last_{window}'] = df.groupby('athlete_id_1')[stat].transform(
-                lambda x: x.shift(1).rolling(window, min_periods=1).mean()
-            )
+        start = rows - np.minimum(games_before, window)
+        sums = totals[rows] - totals[start]
+        present = present_totals[rows] - present_totals[start]
+        with np.errstate(invalid='ignore', divide='ignore'): # No earlier stats (e.g. a first game) stays NaN
+            averages = np.where(present > 0, sums / present, np.nan)
+        for i, stat in enumerate(stats):
+            df[f'avg_{stat}_last_{window}'] = averages[:, i]
     return df
 
+def append_game_logs(historical_df, new_logs_df, max_window=10):
+    """
+    Appends new game logs to the history, calculating rolling features only for the
+    players who just played. A new game's features depend on at most that player's
+    last `max_window` earlier games, so the rest of the history is left untouched.
+    """
+    keys = ['game_id', 'athlete_id_1']
+    new_logs_df = new_logs_df.astype({'game_id': int})
+    # A player listed twice in one game's payload must not count as their own previous game
+    new_logs_df = new_logs_df.drop_duplicates(subset=keys, keep='last')
+
+    # Re-running a day replaces its rows instead of duplicating them
+    is_replaced = historical_df.set_index(keys).index.isin(new_logs_df.set_index(keys).index)
+    history = historical_df[~is_replaced]
+
+    recent_games = history[history['athlete_id_1'].isin(new_logs_df['athlete_id_1'])]
+    recent_games = recent_games.sort_values(by='game_date').groupby('athlete_id_1').tail(max_window)
+    new_rows = update_features(pd.concat([recent_games, new_logs_df])).merge(new_logs_df[keys], on=keys)
+    new_rows.dropna(inplace=True) # Remove rows where features couldn't be calculated
+
+    return pd.concat([history, new_rows], ignore_index=True)
+
+def downcast_columns(df):
+    """Stores IDs and seasons as narrow ints and the stats and their averages as float32."""
+    stat_columns = [c for c in df.columns if c in ('points', 'rebounds', 'assists') or c.startswith('avg_')]
+    return df.astype({'athlete_id_1': 'int32', 'season': 'int16', **dict.fromkeys(stat_columns, 'float32')})
+
+def latest_stats_by_player(df):
+    """Reduces the game log to each player's most recent game, indexed by athlete ID."""
+    # One grouped pass picks each player's latest game without sorting the whole log.
+    # load_historical_data in app.py repeats this reduction for its fallback; keep them in sync.
+    latest = df.loc[df.groupby('athlete_id_1')['game_date'].idxmax()]
+    return latest.set_index('athlete_id_1')
+
 if __name__ == "__main__":
     # --- 1. Load existing data ---
+    # wnba_data_for_app.parquet is the source of truth; the CSV is only an export of it,
+    # read here just to bootstrap a checkout that has no Parquet file yet
     try:
-        historical_df = pd.read_csv("wnba_data_for_app.csv")
+        historical_df = pd.read_parquet("wnba_data_for_app.parquet")
     except FileNotFoundError:
-        print("Data file not found. Please ensure wnba_data_for_app.csv exists.")
-        exit()
+        try:
+            historical_df = pd.read_csv("wnba_data_for_app.csv")
+        except FileNotFoundError:
+            print("Data file not found. Please ensure wnba_data_for_app.parquet (or its CSV export) exists.")
+            exit()
 
     # --- 2. Fetch yesterday's data ---
     yesterday = datetime.now() - timedelta(days=1)
@@ -66,23 +153,21 @@ if __name__ == "__main__":
     
     if new_data_raw and new_data_raw.get('events'):
         # --- 3. Parse and combine data ---
-        new_game_logs = parse_espn_data(new_data_raw)
-        if new_game_logs:
-            new_logs_df = pd.DataFrame(new_game_logs)
+        new_logs_df = parse_espn_data(new_data_raw)
+        if not new_logs_df.empty:
             print(f"Found {len(new_logs_df)} new player performances.")
             
-            # Combine old and new, dropping duplicates to be safe
-            combined_df = pd.concat([historical_df, new_logs_df]).drop_duplicates(
-                subset=['game_id', 'athlete_id_1'], keep='last'
-            )
-            
-            # --- 4. Recalculate features and save ---
-            print("Recalculating features on updated dataset...")
-            updated_df = update_features(combined_df)
-            updated_df.dropna(inplace=True) # Remove rows where features couldn't be calculated
+            # --- 4. Calculate features for the new games and save ---
+            print("Calculating features for the new player performances...")
+            updated_df = append_game_logs(historical_df, new_logs_df)
+            updated_df = downcast_columns(updated_df)
             
+            # The CSV is an export kept for backwards compatibility and is rewritten from the
+            # Parquet data on every run, so hand edits belong in the Parquet file
             updated_df.to_csv("wnba_data_for_app.csv", index=False)
-            print("Successfully updated 'wnba_data_for_app.csv' with new game data.")
+            updated_df.to_parquet("wnba_data_for_app.parquet", compression="snappy", index=False)
+            latest_stats_by_player(updated_df).to_parquet("wnba_latest.parquet")
+            print("Successfully updated 'wnba_data_for_app.csv', 'wnba_data_for_app.parquet' and 'wnba_latest.parquet' with new game data.")
         else:
             print("No new player performances to add.")
     else: